@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+'''Compares compiling a large library from plain, gzipped and BGZF files, both
+in full and for a single target block (as when a script includes one part).
+Usage: python3 benchmarks/compressed_libraries.py [--blocks 2000] [--length 5000]'''
+import os
+import gzip
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from fastac import FastaCompiler, Macros
+from fastac import bgzf
+
+def write_library(filename, blocks, length):
+    with open(filename, "w") as Library:
+        for i in range(blocks):
+            seq = ''.join(random.choice("acgt") for _ in range(length))
+            Library.write("> part{}\n; Synthetic part\n{}\n\n".format(i, seq))
+
+def timed(label, filename, targets=None):
+    start = time.time()
+    Compiler = FastaCompiler(Macros)
+    Compiler.compile_file(filename, targets)
+    print("{:<40}{:>8.3f}s".format(label, time.time() - start))
+    return Compiler
+
+def main(Args):
+    workdir = tempfile.mkdtemp()
+    try:
+        plain = os.path.join(workdir, "library.fasta")
+        gzipped, bgzipped = plain + ".gz", plain + ".bgz"
+        write_library(plain, Args.blocks, Args.length)
+        with open(plain, "rb") as Source, gzip.open(gzipped, "wb") as Destination:
+            shutil.copyfileobj(Source, Destination)
+        bgzf.compress_file(plain, bgzipped)
+        for name in (plain, gzipped, bgzipped):
+            print("{:<40}{:>8.1f}MB".format(os.path.basename(name), os.path.getsize(name) / 1e6))
+        target = ["part{}".format(Args.blocks // 2)]
+        reference = timed("plain, full", plain)
+        timed("gzip, full", gzipped)
+        timed("bgzf, full", bgzipped)
+        timed("plain, one target", plain, target)
+        timed("gzip, one target", gzipped, target)
+        timed("bgzf, one target (builds index)", bgzipped, target)
+        indexed = timed("bgzf, one target (cached index)", bgzipped, target)
+        assert indexed.get_block_sequence(target[0]) == reference.get_block_sequence(target[0])
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    ArgP = argparse.ArgumentParser(description="Benchmark compressed library reads.")
+    ArgP.add_argument("--blocks", type=int, default=2000, help="Blocks in the library. Default is 2000.")
+    ArgP.add_argument("--length", type=int, default=5000, help="Length of each block. Default is 5000.")
+    main(ArgP.parse_args())
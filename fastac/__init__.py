@@ -27,3 +27,4 @@ Scripting extensions include:
 '''
 __version__ = "0.2"
 from fastac.compilefasta import FastaCompiler, FastaBlock, Macros, FastaError, FastaCompileError
+from fastac.compilefasta import CompileSession, SharedLibraryCache
@@ -0,0 +1,210 @@
+'''Reading of gzip and BGZF-compressed fasta files and libraries.
+Gzipped files are decompressed as a stream. BGZF files (as written by bgzip)
+are a series of independently-compressed gzip blocks, so given a "virtual offset"
+(the compressed offset of a block shifted left 16 bits, plus an offset into its
+uncompressed data) any position can be read without decompressing what comes
+before. An index of every fasta block's virtual offset and pre-scanned title and
+macro references is kept beside the file, so compiling a few targets from a
+large library only decompresses the BGZF blocks that hold them.'''
+import os
+import gzip
+import json
+import zlib
+import struct
+
+GzipMagic = b"\x1f\x8b"
+# Fixed part of a BGZF block header, up to and including XLEN.
+HeaderFormat = "<4BI2BH"
+HeaderSize = struct.calcsize(HeaderFormat)
+# BGZF blocks hold at most 64KiB; this much input always compresses to fit.
+MaxBlockData = 0xff00
+# An empty block marks the end of a BGZF file.
+EOFBlock = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+# Suffix of title index files, which are kept next to the BGZF file.
+IndexSuffix = ".fci"
+# Saved indexes of any other version are rebuilt. Bump this whenever the index
+# layout or the output of FastaCompiler.scan_block changes.
+IndexVersion = 1
+
+def is_gzip(filename):
+    'True if the file starts with the gzip magic number; BGZF files are gzip, too.'
+    with open(filename, "rb") as InputFile:
+        return InputFile.read(2) == GzipMagic
+
+def is_bgzf(filename):
+    'True if the file starts with a BGZF block, ie. gzip with a "BC" extra subfield.'
+    with open(filename, "rb") as InputFile:
+        header = InputFile.read(HeaderSize + 4)
+    if len(header) < HeaderSize + 4: return False
+    id1, id2, method, flags, mtime, xfl, os_, xlen = struct.unpack(HeaderFormat, header[:HeaderSize])
+    return (id1, id2, method) == (0x1f, 0x8b, 8) and bool(flags & 4) and header[HeaderSize:HeaderSize + 2] == b"BC"
+
+def open_text(filename):
+    'Opens a plain, gzipped or BGZF file for reading as text.'
+    if is_gzip(filename):
+        return gzip.open(filename, "rt")
+    return open(filename)
+
+class BgzfReader(object):
+    '''Reads bytes from a BGZF file by virtual offset. Supports tell(), seek(),
+    read(size) and readline(), and may be used as a context manager.'''
+    def __init__(self, filename):
+        self.file = open(filename, "rb")
+        self._load(0)
+
+    def _load(self, block_start):
+        'Reads and decompresses the BGZF block at the given compressed offset.'
+        self.file.seek(block_start)
+        header = self.file.read(HeaderSize)
+        self.block_start, self.within = block_start, 0
+        if not header:
+            self.data, self.next_block = b"", block_start
+            return
+        id1, id2, method, flags, mtime, xfl, os_, xlen = struct.unpack(HeaderFormat, header)
+        extra = self.file.read(xlen)
+        block_size = None
+        position = 0
+        while position < len(extra):
+            si1, si2, slen = struct.unpack("<2BH", extra[position:position + 4])
+            if (si1, si2) == (66, 67): block_size = struct.unpack("<H", extra[position + 4:position + 6])[0] + 1
+            position += 4 + slen
+        if (id1, id2) != (0x1f, 0x8b) or block_size is None:
+            raise ValueError("Not a BGZF block at offset {}".format(block_start))
+        compressed = self.file.read(block_size - HeaderSize - xlen - 8)
+        crc, size = struct.unpack("<2I", self.file.read(8))
+        self.data = zlib.decompress(compressed, -15)
+        if len(self.data) != size or zlib.crc32(self.data) & 0xffffffff != crc:
+            raise ValueError("Corrupt BGZF block at offset {}".format(block_start))
+        self.next_block = block_start + block_size
+
+    def _advance(self):
+        'Moves to the next non-empty block once this one is used up; False at EOF.'
+        while self.within >= len(self.data):
+            if self.next_block == self.block_start: return False
+            self._load(self.next_block)
+        return True
+
+    def tell(self):
+        return (self.block_start << 16) | self.within
+
+    def seek(self, virtual_offset):
+        block_start, within = virtual_offset >> 16, virtual_offset & 0xffff
+        if block_start != self.block_start: self._load(block_start)
+        self.within = within
+
+    def read(self, size):
+        chunks = []
+        while size > 0 and self._advance():
+            chunk = self.data[self.within:self.within + size]
+            self.within += len(chunk)
+            size -= len(chunk)
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def readline(self):
+        chunks = []
+        while self._advance():
+            end = self.data.find(b"\n", self.within)
+            stop = len(self.data) if end == -1 else end + 1
+            chunks.append(self.data[self.within:stop])
+            self.within = stop
+            if end != -1: break
+        return b"".join(chunks)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def compress_file(source, destination, level=6):
+    'Writes a BGZF-compressed copy of source to destination, like bgzip.'
+    with open(source, "rb") as InputFile, open(destination, "wb") as OutputFile:
+        while True:
+            data = InputFile.read(MaxBlockData)
+            if not data: break
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+            compressed = compressor.compress(data) + compressor.flush()
+            # Header with a single "BC" subfield giving the total block size - 1.
+            OutputFile.write(struct.pack(HeaderFormat, 0x1f, 0x8b, 8, 4, 0, 0, 0xff, 6))
+            OutputFile.write(struct.pack("<2BHH", 66, 67, 2, HeaderSize + 6 + len(compressed) + 8 - 1))
+            OutputFile.write(compressed)
+            OutputFile.write(struct.pack("<2I", zlib.crc32(data) & 0xffffffff, len(data)))
+        OutputFile.write(EOFBlock)
+
+def build_index(filename, scan_block):
+    '''Reads a BGZF fasta file once, returning a list with an entry for each block:
+    its virtual "offset", its "length" in uncompressed bytes and its "scan", as
+    returned by scan_block (normally FastaCompiler.checked_scan). Blocks are split
+    on blank lines, as by FastaCompiler.split_blocks.'''
+    index = []
+    def add_block(offset, lines):
+        text = b"".join(lines)
+        block = text.decode("utf-8").strip()
+        if not block: return
+        scan = scan_block(block)
+        scan['fields'] = sorted(scan['fields'])
+        index.append({"offset": offset, "length": len(text), "scan": scan})
+    with BgzfReader(filename) as Reader:
+        offset, lines = Reader.tell(), []
+        while True:
+            line = Reader.readline()
+            if line in (b"\n", b""):
+                add_block(offset, lines)
+                if not line: break
+                offset, lines = Reader.tell(), []
+            else:
+                lines.append(line)
+    return index
+
+def load_index(filename, scan_block):
+    '''Returns the block index of a BGZF file, as from build_index. The index is
+    cached beside the file and rebuilt if the file has changed since or it was
+    saved by a version of fastac with a different IndexVersion; if it cannot be
+    saved there, it is simply rebuilt each time.'''
+    stat = os.stat(filename)
+    stamp = [stat.st_size, stat.st_mtime]
+    try:
+        with open(filename + IndexSuffix) as IndexFile:
+            saved = json.load(IndexFile)
+        if saved['version'] == IndexVersion and saved['source'] == stamp: return saved['blocks']
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+    index = build_index(filename, scan_block)
+    try:
+        with open(filename + IndexSuffix, "w") as IndexFile:
+            json.dump({"version": IndexVersion, "source": stamp, "blocks": index}, IndexFile)
+    except (IOError, OSError):
+        pass
+    return index
+
+class IndexedBlocks(object):
+    '''A read-only sequence of the block strings in an indexed BGZF file. Blocks
+    are decompressed only when indexed, so compiling a subset of a library
+    doesn't read the rest. Use as a context manager: one reader is kept open
+    until it exits, so blocks sharing a BGZF block don't decompress it again.'''
+    def __init__(self, filename, index):
+        self.filename = filename
+        self.index = index
+        self.reader = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        if self.reader is None: self.reader = BgzfReader(self.filename)
+        self.reader.seek(self.index[i]['offset'])
+        return self.reader.read(self.index[i]['length']).decode("utf-8").strip()
+
+    def close(self):
+        if self.reader is not None: self.reader.close()
+        self.reader = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
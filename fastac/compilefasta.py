@@ -1,10 +1,17 @@
 #!/usr/bin/env python3
 '''A simple "compiler" for commented fasta.'''
 import argparse
+import sys
+import threading
 import shlex
 import json
+import os
 import collections
+from string import Formatter
 from fastac import sequtils
+from fastac import bgzf
+from fastac import sitescan
+from fastac import seqstats
 
 # Handy functions:
 def _chunks(l, n):
@@ -55,6 +62,20 @@ def get_lib_var(string):
     else: varname = string
     return lib, varname
 
+def _template_fields(string):
+    '''Returns the set of named replacement fields in a format string, so
+    "{0}{someblock}{other.attr}" gives {"someblock", "other"}. Positional fields
+    are skipped, and strings that are not valid format strings give an empty set.'''
+    fields = set()
+    try:
+        for literal, field, spec, conversion in Formatter().parse(string):
+            if not field: continue
+            field = field.split(".")[0].split("[")[0]
+            if field and not field.isdigit(): fields.add(field)
+    except ValueError:
+        pass
+    return fields
+
 Macros = {
 # Place macro functions in this dictionary. They should accept a list of arguments
 # as given by shlex.split: one convenient way to handle this is to define an
@@ -66,15 +87,10 @@ Macros = {
 # manipulation of Parser/Namespace data.
 }
 
-# imported_libs contains Parsers used to parse referenced "libraries", but not the
-# current parser. Parsers are keyed by the name of their library file.
-imported_libs = {}
-def get_library(libname):
-    if libname not in imported_libs:
-        lib = FastaCompiler(Macros)
-        lib.compile_file(libname)
-        imported_libs[libname] = lib
-    return imported_libs[libname]
+def get_library(libname, targets=None):
+    '''Returns the compiled library from the default session, compiling and
+    caching it if necessary; see CompileSession.get_library.'''
+    return default_session.get_library(libname, targets)
 
 def include(args, env_dict):
     # Using argparse allows flexible use of the argument list with optional args
@@ -97,7 +113,7 @@ def include(args, env_dict):
         libname, blockname = get_lib_var(args.block_name)
     if libname:
         # If not already imported, import a multifasta "library" and use that as "lib".
-        lib = get_library(libname)
+        lib = env_dict['namespace'].library(libname)
     else:
         # Use current FastaCompiler object, passed as "namespace".
         lib = env_dict['namespace']
@@ -107,7 +123,7 @@ Macros['include'] = include
 def _peer_call_include(block_name, lib_name, env_dict):
     'An internal shorthand for calling include from other "macros" despite pre-parsed args.'
     call_args = ["--lib", lib_name, block_name] if lib_name else [block_name]
-    return Macros['include'](call_args, env_dict)
+    return env_dict['namespace'].macros['include'](call_args, env_dict)
 Macros['_peer_call_include'] = _peer_call_include
 
 def complement(args, env_dict):
@@ -116,7 +132,7 @@ def complement(args, env_dict):
     ArgP.add_argument("--lib")
     args = ArgP.parse_args(args)
     # This demonstrates trans-macro calls, but also the awkwardness of doing so
-    seq = Macros['_peer_call_include'](args.block_name, args.lib, env_dict)
+    seq = env_dict['namespace'].macros['_peer_call_include'](args.block_name, args.lib, env_dict)
     seq = sequtils.get_complement(seq)
     return seq.lower()
 Macros['complement'] = complement
@@ -127,7 +143,7 @@ def translate(args, env_dict):
     ArgP.add_argument("--lib")
     ArgP.add_argument("--table", default="table1")
     args = ArgP.parse_args(args)
-    seq = Macros['_peer_call_include'](args.block_name, args.lib, env_dict)
+    seq = env_dict['namespace'].macros['_peer_call_include'](args.block_name, args.lib, env_dict)
     aminoseq = sequtils.translate(seq, args.table)
     return aminoseq
 Macros['translate'] = translate
@@ -138,7 +154,7 @@ def dumb_backtranslate(args, env_dict):
     ArgP.add_argument("--lib")
     ArgP.add_argument("--table", default="table1")
     args = ArgP.parse_args(args)
-    seq = Macros['_peer_call_include'](args.block_name, args.lib, env_dict)
+    seq = env_dict['namespace'].macros['_peer_call_include'](args.block_name, args.lib, env_dict)
     rtr_seq = sequtils.dumb_backtranslate(seq, args.table)
     return rtr_seq
 Macros['dumb_backtranslate'] = dumb_backtranslate
@@ -152,11 +168,100 @@ def mutate(args, env_dict):
     ArgP.add_argument("position", type=int)
     ArgP.add_argument("substitution", type=str)
     args = ArgP.parse_args(args)
-    seq = Macros['_peer_call_include'](args.block_name, args.lib, env_dict)
+    seq = env_dict['namespace'].macros['_peer_call_include'](args.block_name, args.lib, env_dict)
     nseq = seq[:args.position-1] + args.substitution + seq[args.position:]
     return nseq.lower()
 Macros['mutate'] = mutate
 
+def edit(args, env_dict):
+    '''Returns specified block with many substitutions/insertions/deletions applied
+    in one pass. Edits are given inline as POS:REF>ALT and/or read from a
+    tab-separated or VCF file; all positions refer to the unedited block. For a
+    VCF file covering several sequences, --chrom picks the CHROM to apply.
+    With --here, the sequence compiled so far in the current block is edited in
+    place instead, and its comments are shifted to match.
+    Usage: $edit [--lib libfile] [--file edits.tsv [--chrom name]] block [POS:REF>ALT ...]
+           $edit --here [--file edits.tsv [--chrom name]] [POS:REF>ALT ...]'''
+    ArgP = argparse.ArgumentParser()
+    ArgP.add_argument("args", nargs="*")
+    ArgP.add_argument("--lib")
+    ArgP.add_argument("--file")
+    ArgP.add_argument("--chrom")
+    ArgP.add_argument("--here", action="store_true")
+    args = ArgP.parse_args(args)
+    inline_edits = args.args if args.here else args.args[1:]
+    edits = [sequtils.parse_edit(x) for x in inline_edits]
+    if args.file: edits.extend(sequtils.read_edits(args.file, args.chrom))
+    if not args.here:
+        if not args.args: raise ValueError("edit requires a block name unless --here is given.")
+        seq = env_dict['namespace'].macros['_peer_call_include'](args.args[0], args.lib, env_dict)
+        return sequtils.apply_edits(seq, edits).lower()
+    current_lines, meta = env_dict['current_lines'], env_dict['meta']
+    seq = ''.join(current_lines)
+    spans = sequtils.check_edits(seq, edits)
+    current_lines[:] = [sequtils.apply_edits(seq, edits)]
+    meta['comments'] = sequtils.shift_comments(meta['comments'], spans)
+Macros['edit'] = edit
+
+def _site_scanner(motif_args, sites_lib, env_dict):
+    '''Builds a SiteScanner from NAME=MOTIF arguments and, if given, every block
+    of a fasta library of motifs (titles are used as names).'''
+    motifs = [sitescan.parse_motif(x) for x in motif_args]
+    if sites_lib:
+        # Fetched without targets, so every motif is compiled even when this is
+        # a targeted compile using a pruned copy of the same library.
+        lib = env_dict['namespace'].session.get_library(sites_lib)
+        motifs.extend((title, lib.namespace[title].sequence) for title in lib.namespace)
+    if not motifs: raise ValueError("No sites or motifs were given to scan for.")
+    return sitescan.SiteScanner(motifs)
+
+def assert_no_sites(args, env_dict):
+    '''Fails the compile if any of the given motifs (IUPAC codes allowed) occur on
+    either strand of the named block, or of the current block so far if no
+    block is named. Returns nothing.
+    Usage: $assert_no_sites [--block [libfile.]block] [--sites sitelib.fasta] [NAME=]MOTIF ...'''
+    ArgP = argparse.ArgumentParser()
+    ArgP.add_argument("motifs", nargs="*")
+    ArgP.add_argument("--block")
+    ArgP.add_argument("--sites")
+    args = ArgP.parse_args(args)
+    scanner = _site_scanner(args.motifs, args.sites, env_dict)
+    if args.block:
+        seq = env_dict['namespace'].macros['_peer_call_include'](args.block, None, env_dict)
+        where = "block '{}'".format(args.block)
+    else:
+        seq = ''.join(env_dict['current_lines'])
+        where = "current block"
+    hits = scanner.scan(seq)
+    if hits:
+        raise FastaCompileError("Forbidden sites found in {}: {}".format(where, scanner.describe(hits)))
+Macros['assert_no_sites'] = assert_no_sites
+
+def annotate_sites(args, env_dict):
+    '''Records every hit of the given motifs on either strand of the current block
+    so far as a comment in its metadata, eg. [12, 17, "EcoRI (+)"]. Returns nothing.
+    Usage: $annotate_sites [--sites sitelib.fasta] [NAME=]MOTIF ...'''
+    ArgP = argparse.ArgumentParser()
+    ArgP.add_argument("motifs", nargs="*")
+    ArgP.add_argument("--sites")
+    args = ArgP.parse_args(args)
+    scanner = _site_scanner(args.motifs, args.sites, env_dict)
+    for start, end, name, strand in scanner.scan(''.join(env_dict['current_lines'])):
+        env_dict['meta']['comments'].append([start, end, "{} ({})".format(name, strand)])
+Macros['annotate_sites'] = annotate_sites
+
+def stats(args, env_dict):
+    '''Records GC content, homopolymer and direct repeat statistics for the current
+    block so far in its metadata under "stats", including a list of "violations"
+    of the given thresholds. Requires NumPy. Returns nothing.
+    Usage: $stats [--window 50] [--gc-low 0.25] [--gc-high 0.75] [--max-homopolymer 8] [--repeat-length 16]'''
+    ArgP = argparse.ArgumentParser()
+    seqstats.add_arguments(ArgP)
+    args = ArgP.parse_args(args)
+    seq = ''.join(env_dict['current_lines'])
+    env_dict['meta']['stats'] = seqstats.sequence_stats(seq, **seqstats.thresholds(args))
+Macros['stats'] = stats
+
 def def_template(args, env_dict):
     '''Registers the foregoing parsed_lines as a new template in the templates dictionary.
     Templates take the form of positional or named python format strings: positional
@@ -196,7 +301,7 @@ def use_template(args, env_dict):
     # to get templates from libs.
     templatelib, templatename = get_lib_var(args.templatename)
     if templatelib:
-        lib = get_library(templatelib)
+        lib = env_dict['namespace'].library(templatelib)
     else:
         lib = env_dict['namespace']
     template = lib.templates[templatename]
@@ -209,7 +314,7 @@ def use_template(args, env_dict):
             # The default mode; fetch blocks by name.
             # Now that include natively supports implicit imports like libname.fasta.blockname,
             # the use of library blocks to *fill* a template is supported, also.
-            positional_seqs.append(Macros['_peer_call_include'](blockname, None, env_dict))
+            positional_seqs.append(env_dict['namespace'].macros['_peer_call_include'](blockname, None, env_dict))
     return template.format(*positional_seqs, **lib.namespace)
 Macros['use_template'] = use_template
 
@@ -237,6 +342,13 @@ class FastaBlock(object):
     def _chunks(l, n):
         for i in range(0, len(l), n): yield l[i:i+n]
 
+    def apply_edits(self, edits):
+        '''Applies (position, ref, alt) edits to this block in one pass, shifting
+        comment positions in meta to match. See sequtils.check_edits.'''
+        spans = sequtils.check_edits(self.sequence, edits)
+        self.sequence = sequtils.apply_edits(self.sequence, edits).lower()
+        self.meta['comments'] = sequtils.shift_comments(self.meta.get('comments', []), spans)
+
     def as_dict(self):
         'Used for exporting whole namespaces as JSON by converting subunits to dicts.'
         return {"title":self.title, "sequence":self.sequence,
@@ -263,41 +375,258 @@ class FastaBlock(object):
 
 class FastaCompiler(object):
     '''Contains methods for compiling blocks, multifasta files.
-    Also acts as a scope for precompiled blocks.'''
-    def __init__(self, macros={}, linewrap=50, lettercase="lower", namespace = {}, templates = {}):
-        self.macros = macros
+    Also acts as a scope for precompiled blocks.
+    Compilers created without session= all share the module-global
+    default_session, whose macros and libraries are not locked, so only use
+    them from one thread; see CompileSession for compiling in parallel.'''
+    def __init__(self, macros=None, linewrap=50, lettercase="lower", namespace=None, templates=None,
+                 low_memory=False, session=None):
+        # The session owns the library cache; see CompileSession.
+        self.session = default_session if session is None else session
+        self.macros = self.session.macros if macros is None else macros
         self.linewrap = linewrap
         self.lettercase = lettercase
-        self.namespace = collections.OrderedDict(namespace)
-        self.templates = templates
+        self.namespace = collections.OrderedDict(namespace or {})
+        self.templates = {} if templates is None else templates
+        # None if every block was compiled, else the set of targets compiled for.
+        self.targets = None
+        # Names needed from each library when compiling for targets; see library.
+        self.library_targets = {}
+        # In low memory mode, private blocks are released after their last use,
+        # leaving their titles here so that later lookups fail clearly.
+        self.low_memory = low_memory
+        self.released = set()
+        # Bytes of sequence held in this namespace; libraries keep their own count.
+        self.resident_bytes = 0
+        self.peak_bytes = 0
+
+    def compile_file(self, filen, targets=None):
+        '''Compiles a fasta file, which may be plain, gzipped or BGZF-compressed.
+        With targets, an indexed BGZF file only has the blocks needed read from it.'''
+        if targets is not None and bgzf.is_bgzf(filen):
+            index = bgzf.load_index(filen, self.checked_scan)
+            with bgzf.IndexedBlocks(filen, index) as Blocks:
+                self.compile_blocks(Blocks, targets, [entry['scan'] for entry in index])
+            return
+        with bgzf.open_text(filen) as InputFile:
+            self.compile_multifasta(InputFile.read(), targets)
 
-    def compile_file(self, filen):
-        with open(filen) as InputFile:
-            self.compile_multifasta(InputFile.read())
-
-    def compile_multifasta(self, file_contents):
-        for Block in file_contents.strip().split("\n\n"):
-            Block = Block.strip() # Handles more than one blank line b/w blocks.
+    @staticmethod
+    def split_blocks(file_contents):
+        'Splits a multifasta string into its (stripped) blocks.'
+        # Stripping handles more than one blank line b/w blocks.
+        return [Block.strip() for Block in file_contents.strip().split("\n\n")]
+
+    def compile_multifasta(self, file_contents, targets=None):
+        '''Compiles every block in file_contents into the namespace. If targets
+        (a list of block titles or template names) is given, only the blocks needed
+        to build those targets are compiled; see resolve_targets.'''
+        self.compile_blocks(self.split_blocks(file_contents), targets)
+
+    def compile_blocks(self, Blocks, targets=None, scans=None):
+        '''Compiles a sequence of block strings, or only those needed for targets.
+        Blocks is only indexed for the blocks that are compiled, so it may read them
+        lazily. Scans, if given, are the scan_block results for every block.'''
+        if scans is None and (targets is not None or self.low_memory):
+            scans = [self.checked_scan(Block) for Block in Blocks]
+        if targets is not None:
+            needed, self.library_targets = self.resolve_targets(scans, targets)
+            Blocks = [Blocks[i] for i in sorted(needed)]
+            scans = [scans[i] for i in sorted(needed)]
+            self.targets = set(targets)
+        schedule = self.release_schedule(scans) if self.low_memory else {}
+        # The index of the block currently holding each title, so a block that
+        # redefines a private title isn't released on its predecessor's schedule.
+        defined_by = {}
+        for i, Block in enumerate(Blocks):
             try:
                 self.compile_block(Block)
             except Exception as E:
                 # For debug, just raise. Can later sort out common exceptions
                 # and raise more informative errors or catch/ignore.
                 #raise E
-                errmsg = "Error compiling block with first line "+Block.splitlines()[0]+":\n\t"+str(E)
-                raise FastaCompileError(errmsg)
+                raise FastaCompileError(self._block_error(Block, E))
+            if scans is not None and scans[i]['title']: defined_by[scans[i]['title']] = i
+            for j in schedule.get(i, []):
+                if defined_by.get(scans[j]['title']) == j: self.release_block(scans[j]['title'])
+
+    def library(self, libname):
+        '''Returns a compiled library for macros to import from. When compiling for
+        targets, it is pruned to the names the pre-scan found are needed from it,
+        so every import from one library during a compile uses the same copy.'''
+        return self.session.get_library(libname, self.library_targets.get(libname))
+
+    def register_block(self, FastaObj):
+        'Adds a compiled FastaBlock to the namespace, tracking resident sequence size.'
+        if FastaObj.title in self.namespace:
+            self.resident_bytes -= len(self.namespace[FastaObj.title].sequence)
+        self.released.discard(FastaObj.title)
+        self.namespace[FastaObj.title] = FastaObj
+        self.resident_bytes += len(FastaObj.sequence)
+        self.peak_bytes = max(self.peak_bytes, self.resident_bytes)
+
+    def release_block(self, title):
+        'Drops a block from the namespace, leaving a tombstone in self.released.'
+        if title not in self.namespace: return
+        self.resident_bytes -= len(self.namespace.pop(title).sequence)
+        self.released.add(title)
+
+    @staticmethod
+    def _block_error(block, E):
+        'Returns an error message for exception E, naming the block it came from.'
+        return "Error compiling block with first line "+block.splitlines()[0]+":\n\t"+str(E)
+
+    @classmethod
+    def checked_scan(cls, block):
+        'As scan_block, but errors are raised as FastaCompileErrors naming the block.'
+        try:
+            return cls.scan_block(block)
+        except Exception as E:
+            raise FastaCompileError(cls._block_error(block, E))
+
+    @staticmethod
+    def scan_block(block):
+        '''Cheaply pre-scans a block without compiling it. Returns a dict with the
+        block's "title" (empty for anonymous blocks), title "meta", the shlex-split
+        "macros" it calls, the "template" it defines (or None) and the named format
+        "fields" in its literal lines, which matter if it defines a template.'''
+        scan = {"title":'', "meta":{}, "macros":[], "template":None, "fields":set()}
+        for line in block.splitlines():
+            line = line.strip()
+            if not line: continue
+            if line[0] == ">":
+                json_meta, scan['title'] = _getjson(line.lstrip(">").lstrip())
+                for json_object in json_meta:
+                    FastaCompiler.import_inline_meta(scan['meta'], json_object)
+            elif line[0] == "$":
+                macroline = shlex.split(line[1:])
+                if not macroline: continue
+                scan['macros'].append(macroline)
+                if macroline[0] == "def_template" and len(macroline) > 1:
+                    scan['template'] = macroline[1]
+            elif line[0] not in ";#":
+                scan['fields'].update(_template_fields(line))
+        return scan
+
+    @staticmethod
+    def _macro_references(macroline):
+        '''Yields every (libname, name) pair a macro call might refer to. As macros
+        are arbitrary functions, each free argument is treated as a possible block
+        or template name; over-matching only means an extra block is compiled.'''
+        args = macroline[1:]
+        libname = None
+        if "--lib" in args and args.index("--lib") + 1 < len(args):
+            libname = args[args.index("--lib") + 1]
+        for arg in args:
+            if arg.startswith("-"): continue
+            yield None, arg
+            if libname: yield libname, arg
+            lib, varname = get_lib_var(arg)
+            if lib: yield lib, varname
+
+    def block_dependencies(self, scans):
+        '''Statically works out which blocks each block uses, given the scan_block
+        result of every block. Returns a list holding, for each block, a set of
+        indices of the blocks it needs and a dict mapping library filenames to the
+        names it needs from each, along with a function resolve(names, deps, remote)
+        which resolves further (libname, name) pairs against the namespace as it
+        stands after all blocks.
+        Names resolve to the most recent block defining them, as they would during
+        a compile. Using a template also needs the blocks its named fields refer to.'''
+        latest_blocks, latest_templates = {}, {}
+        dependencies = []
+        def resolve(names, deps, remote):
+            # Resolves names against definitions so far, into deps and remote.
+            for lib, name in names:
+                if lib is not None:
+                    if os.path.isfile(lib):
+                        remote.setdefault(lib, set()).add(name)
+                    continue
+                if name in latest_blocks:
+                    deps.add(latest_blocks[name])
+                if name in latest_templates:
+                    template_index = latest_templates[name]
+                    deps.add(template_index)
+                    for field in scans[template_index]['fields']:
+                        if field in latest_blocks: deps.add(latest_blocks[field])
+        for i, scan in enumerate(scans):
+            deps, remote = set(), {}
+            for macroline in scan['macros']:
+                resolve(self._macro_references(macroline), deps, remote)
+            dependencies.append((deps, remote))
+            if scan['template']: latest_templates[scan['template']] = i
+            if scan['title']: latest_blocks[scan['title']] = i
+        return dependencies, resolve
+
+    def resolve_targets(self, scans, targets):
+        '''Given the scan_block result of every block and a list of target block titles
+        or template names, works out which blocks must be compiled to build the
+        targets. Returns a set of block indices and a dict mapping library filenames to
+        the set of names needed from each library.
+        Anonymous blocks are only kept if they define a needed template.
+        Targets that match nothing are ignored.'''
+        dependencies, resolve = self.block_dependencies(scans)
+        # Targets resolve against the namespace as it stands after a full compile.
+        pending, lib_targets = set(), {}
+        # Unknown targets are ignored, as library targets are only guesses.
+        resolve([(None, target) for target in targets], pending, lib_targets)
+        needed = set()
+        while pending:
+            i = pending.pop()
+            if i in needed: continue
+            needed.add(i)
+            deps, remote = dependencies[i]
+            pending.update(deps)
+            for lib in remote:
+                lib_targets.setdefault(lib, set()).update(remote[lib])
+        return needed, lib_targets
+
+    def release_schedule(self, scans):
+        '''Given the scan_block result of every block to be compiled, counts
+        references to each private block from later macro lines, and
+        returns a dict mapping each block index to the indices of private blocks
+        that can be released once it has compiled. Unused private blocks are
+        released straight after compiling. Targets are never released.'''
+        dependencies = self.block_dependencies(scans)[0]
+        last_use = collections.OrderedDict()
+        for i, scan in enumerate(scans):
+            for j in dependencies[i][0]:
+                if j in last_use: last_use[j] = i
+            if scan['title'] and scan['meta'].get("private"):
+                last_use[i] = i
+        schedule = {}
+        for j, i in last_use.items():
+            if self.targets is not None and scans[j]['title'] in self.targets: continue
+            schedule.setdefault(i, []).append(j)
+        return schedule
+
+    @staticmethod
+    def last_title(scans, print_all=False):
+        '''Returns the title of the last titled block, given the scan_block result
+        of every block, skipping private blocks unless print_all, or None if there
+        is none.'''
+        for scan in reversed(scans):
+            if not scan['title']: continue
+            if scan['meta'].get("private") and not print_all: continue
+            return scan['title']
 
     def get_block(self, title):
         if title not in self.namespace:
             errmsg="Could not find {} - Current namespace: {}".format(title, str(self.namespace))
+            if title in self.released:
+                errmsg = ("Block {} is private and was released from memory after its last"
+                          " expected use (low memory mode)".format(title))
+            elif self.targets is not None:
+                errmsg += " (only blocks needed for {} were compiled)".format(sorted(self.targets))
             raise ValueError(errmsg)
         return self.namespace[title]
 
     def get_block_sequence(self, title):
         return self.get_block(title).sequence
 
-    def do_macro(self, macroline, current_lines):
-        '''Is passed the macro call line and all lines already parsed.
+    def do_macro(self, macroline, current_lines, meta=None):
+        '''Is passed the macro call line, all lines already parsed and the meta
+        dict of the block being compiled.
         As macros are passed this and the Parser object itself, macros can
         independently define actions to take directly on the namespace or Parser.'''
         macroline = shlex.split(macroline.strip()[1:])
@@ -305,6 +634,7 @@ class FastaCompiler(object):
         # variables or objects passed to macros/functions without having to
         # rewrite them all again..
         environment = {"current_lines":current_lines,
+                       "meta":meta,
                        "namespace":self}
         result = ''
         if macroline[0] in self.macros:
@@ -393,7 +723,7 @@ class FastaCompiler(object):
                 # Comments, don't keep.
                 pass
             elif line[0] == "$":
-                result = self.do_macro(line, lines)
+                result = self.do_macro(line, lines, meta)
                 # Not all macros may return results, but if they do, it's to be
                 # included in current block.
                 if result: lines.append(result)
@@ -406,13 +736,25 @@ class FastaCompiler(object):
             FastaObj = FastaBlock(title, ''.join(lines), meta)
             # Finally:
             if returnblock: return FastaObj
-            else: self.namespace[FastaObj.title] = FastaObj
-
-    def as_multifasta(self, preserve_meta=True, print_all=False):
+            else: self.register_block(FastaObj)
+
+    def add_stats(self, **thresholds):
+        '''Adds sequence statistics to the "stats" metadata of every nucleotide block
+        in the namespace and returns them as a dict keyed by title. Keyword
+        arguments are passed to seqstats.sequence_stats.'''
+        report = collections.OrderedDict()
+        for title in self.namespace:
+            block = self.namespace[title]
+            if block.type not in ("dna", "rna"): continue
+            block.meta['stats'] = report[title] = seqstats.sequence_stats(block.sequence, **thresholds)
+        return report
+
+    def as_multifasta(self, preserve_meta=True, print_all=False, titles=None):
         '''Return namespace in order of compilation as a multi-fasta file.
         If preserve_meta is true, export as "metafasta", where metadata is
         kept in a json block in the title. This is ugly, but lossless and cross-
-        compatible with other bioinfo tools, which will ignore the big title.'''
+        compatible with other bioinfo tools, which will ignore the big title.
+        If titles is given, only those blocks are exported, private or not.'''
         Export_Blocks = []
         for subblock in self.namespace:
             # As self.namespace is an OrderedDict, this will export in the same
@@ -420,7 +762,9 @@ class FastaCompiler(object):
             # Could also achieve this effect by keeping a list of compiled titles
             # and iterating over the list to get things from the namespace dict
             # in order: might be worth checking if this is more efficient?
-            if "private" in self.namespace[subblock].meta and\
+            if titles is not None:
+                if subblock not in titles: continue
+            elif "private" in self.namespace[subblock].meta and\
              self.namespace[subblock].meta["private"] and\
              not print_all: continue
             if preserve_meta: Export_Blocks.append(self.namespace[subblock].as_metafasta())
@@ -434,14 +778,119 @@ class FastaCompiler(object):
             jsonablenamespace[FastaObject.title] = FastaObject.as_dict()
         return json.dumps(jsonablenamespace, indent=indent)
 
+class SharedLibraryCache(object):
+    '''A cache of compiled libraries that several CompileSessions, possibly in
+    different threads, can share. Each library is compiled once, under a lock per
+    library file, and is then treated as read-only. Sessions sharing a cache
+    should use the same macros, as libraries are compiled with those of whichever
+    session first needs them.'''
+    def __init__(self):
+        self.libraries = {}
+        self.lock = threading.Lock()
+        self.library_locks = {}
+
+    def get_library(self, libname, targets, compile_library):
+        '''Returns the cached library, calling compile_library(libname, targets) to
+        compile it if it is missing. Libraries pruned to targets are cached apart
+        from the full library, keyed by their set of targets.'''
+        key = (os.path.abspath(libname), None if targets is None else frozenset(targets))
+        with self.lock:
+            # Re-entrant, so a library that imports itself fails as it always has.
+            library_lock = self.library_locks.setdefault(key, threading.RLock())
+        with library_lock:
+            with self.lock:
+                lib = self.libraries.get(key)
+            if lib is not None: return lib
+            lib = compile_library(key[0], targets)
+            with self.lock:
+                self.libraries[key] = lib
+            return lib
+
+class CompileSession(object):
+    '''Owns the macro registry and library cache used by a set of FastaCompilers,
+    so that designs compiled in different sessions cannot interfere. A session
+    should only be used by one thread at a time; to compile in parallel, give
+    each thread its own session, optionally sharing a SharedLibraryCache so that
+    libraries are only compiled once.
+    If macros is not given, the session gets its own copy of Macros.'''
+    def __init__(self, macros=None, library_cache=None):
+        self.macros = dict(Macros) if macros is None else macros
+        self.library_cache = library_cache
+        # Compiled libraries, keyed by filename, if not using library_cache.
+        self.libraries = {}
+        # Libraries compiled for targets, keyed by (filename, frozenset of targets).
+        self.pruned_libraries = {}
+
+    def compiler(self, *args, **kwargs):
+        'Returns a new FastaCompiler using this session; arguments are as for FastaCompiler.'
+        kwargs['session'] = self
+        return FastaCompiler(*args, **kwargs)
+
+    def compile_library(self, libname, targets=None):
+        'Compiles a library file with this session, without caching it.'
+        lib = FastaCompiler(self.macros, session=self)
+        lib.compile_file(libname, targets)
+        return lib
+
+    def get_library(self, libname, targets=None):
+        '''Returns the compiled library, compiling and caching it if necessary.
+        If targets is given, only the blocks and templates needed for them are
+        compiled, and the result is cached apart from the full library. Cached
+        libraries are never recompiled or replaced, so each is compiled once.'''
+        if self.library_cache is not None:
+            return self.library_cache.get_library(libname, targets, self.compile_library)
+        if targets is None:
+            if libname not in self.libraries:
+                self.libraries[libname] = self.compile_library(libname)
+            return self.libraries[libname]
+        key = (libname, frozenset(targets))
+        if key not in self.pruned_libraries:
+            self.pruned_libraries[key] = self.compile_library(libname, targets)
+        return self.pruned_libraries[key]
+
+# The session used by FastaCompilers created without one, and by get_library.
+# It uses Macros itself, so macros added to Macros later are still available.
+default_session = CompileSession(Macros)
+# imported_libs contains Parsers used to parse referenced "libraries", but not the
+# current parser. Parsers are keyed by the name of their library file.
+imported_libs = default_session.libraries
+
 def main(Args):
     'Expects an argparse parse_args namespace.'
-    LocalCompiler = FastaCompiler(Macros, Args.linelength, Args.case)
-    LocalCompiler.compile_file(Args.fastafile)
-    output = LocalCompiler.as_multifasta(Args.plain, Args.print_all)
+    if Args.low_memory and Args.print_all and not (Args.target or Args.last):
+        raise ValueError("--low-memory releases private blocks, so cannot be used with --print-all"
+                         " unless the blocks wanted are given with --target or --last.")
+    LocalCompiler = FastaCompiler(Macros, Args.linelength, Args.case, low_memory=Args.low_memory)
+    # The main file may be plain, gzipped or BGZF. If only some blocks are wanted
+    # from a BGZF file, its index is used so that the rest are never read.
+    indexed = bool(Args.target or Args.last) and bgzf.is_bgzf(Args.fastafile)
+    if indexed:
+        scans = [entry['scan'] for entry in bgzf.load_index(Args.fastafile, FastaCompiler.checked_scan)]
+    else:
+        with bgzf.open_text(Args.fastafile) as InputFile:
+            blocks = FastaCompiler.split_blocks(InputFile.read())
+        scans = [FastaCompiler.checked_scan(Block) for Block in blocks] if Args.last else None
+    targets = Args.target
     if Args.last:
-        # Split to get only the last block.
-        output = output.split("\n\n").pop()
+        # Only the last titled block in the main file is wanted.
+        last = FastaCompiler.last_title(scans, Args.print_all)
+        targets = (targets or []) + ([last] if last else [])
+    if indexed:
+        LocalCompiler.compile_file(Args.fastafile, targets)
+    else:
+        LocalCompiler.compile_blocks(blocks, targets, scans)
+    if targets is not None:
+        for target in targets:
+            if target not in LocalCompiler.namespace and target not in LocalCompiler.templates:
+                raise FastaCompileError("Could not find target block '{}'".format(target))
+    if Args.stats or Args.stats_report:
+        report = LocalCompiler.add_stats(**seqstats.thresholds(Args))
+        if Args.stats_report:
+            with open(Args.stats_report, 'w') as ReportFile:
+                json.dump(report, ReportFile, indent=2)
+    if Args.memory_report:
+        sys.stderr.write("Peak resident sequence bytes: {}\n".format(LocalCompiler.peak_bytes))
+    output = LocalCompiler.as_multifasta(Args.plain, Args.print_all, targets)
     if Args.output:
         with open(Args.output, 'w') as OutFile:
             OutFile.write(output)
@@ -461,5 +910,16 @@ if __name__ == "__main__":
     ArgP.add_argument("-P", "--print-all", default=False, action="store_true",
                   help="Prints all blocks, including those with the 'private' metatag.")
     ArgP.add_argument("-L", "--last", default=False, action="store_true",
-                  help="Only output the last fasta block compiled in the main file.")
+                  help="Only compile and output the last fasta block in the main file.")
+    ArgP.add_argument("-t", "--target", action="append",
+                  help="Only compile the blocks needed for this block, and output it. May be repeated.")
+    ArgP.add_argument("-s", "--stats", default=False, action="store_true",
+                  help="Add GC, homopolymer and repeat statistics to block metadata. Requires NumPy.")
+    ArgP.add_argument("--stats-report",
+                  help="Filename to save statistics for every block to, as JSON.")
+    ArgP.add_argument("-m", "--low-memory", default=False, action="store_true",
+                  help="Release private blocks after their last use, except targets. Needs --target or --last with --print-all.")
+    ArgP.add_argument("--memory-report", default=False, action="store_true",
+                  help="Print the peak bytes of sequence held by the main file's blocks to standard error. Libraries are not counted.")
+    seqstats.add_arguments(ArgP)
     main(ArgP.parse_args())
@@ -0,0 +1,141 @@
+'''Windowed sequence statistics for checking designs before synthesis: GC content
+in sliding windows, homopolymer runs and direct repeats.
+All computation is vectorised with NumPy (cumulative sums over the sequence
+as a byte array), so whole-genome-sized blocks take seconds. NumPy is only
+needed by this module; the rest of fastac remains pure Python.'''
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Thresholds used when none are given; these are typical synthesis limits.
+Defaults = {"window": 50, "gc_low": 0.25, "gc_high": 0.75,
+            "max_homopolymer": 8, "repeat_length": 16}
+
+# Regions listed per check are capped so genome-scale metadata stays readable;
+# the full count for each check is reported alongside.
+MaxRegions = 20
+
+def _codes(sequence):
+    'Returns the sequence as a lowercase uint8 array.'
+    if numpy is None:
+        raise ImportError("Sequence statistics require NumPy; install it with 'pip install numpy'.")
+    return numpy.frombuffer(sequence.lower().encode("ascii"), dtype=numpy.uint8)
+
+def _runs(mask):
+    '''Returns (starts, ends) arrays of the runs of True in a boolean array,
+    as 0-based half-open intervals.'''
+    edges = numpy.diff(numpy.concatenate(([0], mask.view(numpy.int8), [0])))
+    return numpy.flatnonzero(edges == 1), numpy.flatnonzero(edges == -1)
+
+def gc_windows(sequence, window=Defaults['window']):
+    '''Returns an array of the GC fraction of every window of the given size,
+    indexed by (0-based) window start. Shorter sequences give one window.'''
+    codes = _codes(sequence)
+    window = max(1, min(window, len(codes)))
+    gc = (codes == ord("g")) | (codes == ord("c")) | (codes == ord("s"))
+    totals = numpy.concatenate(([0], numpy.cumsum(gc, dtype=numpy.int64)))
+    return (totals[window:] - totals[:-window]) / float(window)
+
+def homopolymers(sequence):
+    '''Returns (starts, lengths) arrays of every run of a repeated character,
+    with 0-based starts.'''
+    codes = _codes(sequence)
+    if not len(codes):
+        return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+    starts = numpy.concatenate(([0], numpy.flatnonzero(codes[1:] != codes[:-1]) + 1))
+    lengths = numpy.diff(numpy.concatenate((starts, [len(codes)])))
+    return starts, lengths
+
+def repeated_kmers(sequence, k=Defaults['repeat_length']):
+    '''Returns a boolean array marking every (0-based) start of a k-mer that occurs
+    more than once in the sequence. K-mers containing non-ACGT(U) characters are
+    ignored. K is capped at 32 so that each k-mer packs into one 64-bit integer.'''
+    codes = _codes(sequence)
+    k = min(k, 32)
+    count = len(codes) - k + 1
+    if count < 2: return numpy.zeros(max(count, 0), dtype=bool)
+    lookup = numpy.full(256, 255, dtype=numpy.uint8)
+    for value, bases in enumerate(("a", "c", "g", "tu")):
+        for base in bases: lookup[ord(base)] = value
+    bits = lookup[codes]
+    invalid = numpy.concatenate(([0], numpy.cumsum(bits == 255)))
+    valid = (invalid[k:] - invalid[:-k]) == 0
+    bits = bits.astype(numpy.uint64) & numpy.uint64(3)
+    kmers = numpy.zeros(count, dtype=numpy.uint64)
+    for offset in range(k):
+        kmers = (kmers << numpy.uint64(2)) | bits[offset:offset + count]
+    repeated = numpy.zeros(count, dtype=bool)
+    positions = numpy.flatnonzero(valid)
+    unique, inverse, counts = numpy.unique(kmers[positions], return_inverse=True, return_counts=True)
+    repeated[positions] = counts[inverse] > 1
+    return repeated
+
+def sequence_stats(sequence, window=Defaults['window'], gc_low=Defaults['gc_low'],
+                   gc_high=Defaults['gc_high'], max_homopolymer=Defaults['max_homopolymer'],
+                   repeat_length=Defaults['repeat_length']):
+    '''Returns a JSON-friendly dict of summary statistics for a nucleotide sequence,
+    with a "violations" list describing regions outside the given thresholds.
+    Regions are 1-based and inclusive, like meta comments. At most MaxRegions
+    regions are listed per check; "gc_violations", "homopolymer_violations" and
+    "repeat_violations" give the full counts, and "truncated" is True if any
+    regions were left out.'''
+    length = len(sequence)
+    stats = {"length": length, "violations": [], "gc_violations": 0,
+             "homopolymer_violations": 0, "repeat_violations": 0, "truncated": False}
+    if not length: return stats
+    gc = gc_windows(sequence, window)
+    stats.update({"gc": round(float(gc_windows(sequence, length)[0]), 4),
+                  "gc_window": int(min(window, length)),
+                  "gc_window_min": round(float(gc.min()), 4),
+                  "gc_window_max": round(float(gc.max()), 4)})
+    starts, ends = _runs((gc < gc_low) | (gc > gc_high))
+    stats['gc_violations'] = int(len(starts))
+    for start, end in list(zip(starts, ends))[:MaxRegions]:
+        # A run of bad window starts covers those windows' full extent.
+        stats['violations'].append([int(start) + 1, int(end) + stats['gc_window'] - 1,
+                                    "GC outside {}-{} in {}bp windows".format(gc_low, gc_high, stats['gc_window'])])
+    starts, lengths = homopolymers(sequence)
+    longest = int(lengths.argmax())
+    stats['longest_homopolymer'] = [int(starts[longest]) + 1, int(starts[longest] + lengths[longest]),
+                                    sequence[int(starts[longest])].lower()]
+    long_runs = numpy.flatnonzero(lengths > max_homopolymer)
+    stats['homopolymer_violations'] = int(len(long_runs))
+    for run in long_runs[:MaxRegions]:
+        stats['violations'].append([int(starts[run]) + 1, int(starts[run] + lengths[run]),
+                                    "Homopolymer longer than {}".format(max_homopolymer)])
+    repeated = repeated_kmers(sequence, repeat_length)
+    # Mark every base covered by a repeated k-mer, then merge into regions.
+    k = min(repeat_length, 32)
+    marks = numpy.zeros(length + 1, dtype=numpy.int64)
+    hits = numpy.flatnonzero(repeated)
+    numpy.add.at(marks, hits, 1)
+    numpy.add.at(marks, hits + k, -1)
+    starts, ends = _runs(numpy.cumsum(marks[:-1]) > 0)
+    stats['repeated_kmers'] = int(len(hits))
+    stats['repeat_violations'] = int(len(starts))
+    hotspots = numpy.argsort(starts - ends, kind="stable")[:MaxRegions]
+    stats['repeat_hotspots'] = [[int(starts[i]) + 1, int(ends[i])] for i in hotspots]
+    for start, end in stats['repeat_hotspots']:
+        stats['violations'].append([start, end, "Direct repeat of {}bp or more".format(k)])
+    stats['truncated'] = max(stats['gc_violations'], stats['homopolymer_violations'],
+                             stats['repeat_violations']) > MaxRegions
+    return stats
+
+def add_arguments(ArgP):
+    'Adds threshold options for sequence_stats to an argparse.ArgumentParser.'
+    ArgP.add_argument("--window", type=int, default=Defaults['window'],
+                  help="Window size for GC content. Default is {}.".format(Defaults['window']))
+    ArgP.add_argument("--gc-low", type=float, default=Defaults['gc_low'],
+                  help="Lowest allowed GC fraction in any window. Default is {}.".format(Defaults['gc_low']))
+    ArgP.add_argument("--gc-high", type=float, default=Defaults['gc_high'],
+                  help="Highest allowed GC fraction in any window. Default is {}.".format(Defaults['gc_high']))
+    ArgP.add_argument("--max-homopolymer", type=int, default=Defaults['max_homopolymer'],
+                  help="Longest allowed homopolymer run. Default is {}.".format(Defaults['max_homopolymer']))
+    ArgP.add_argument("--repeat-length", type=int, default=Defaults['repeat_length'],
+                  help="Length of direct repeats to report. Default is {}.".format(Defaults['repeat_length']))
+
+def thresholds(args):
+    'Returns sequence_stats keyword arguments from options added by add_arguments.'
+    return {"window": args.window, "gc_low": args.gc_low, "gc_high": args.gc_high,
+            "max_homopolymer": args.max_homopolymer, "repeat_length": args.repeat_length}
@@ -7,6 +7,7 @@ Part of the DNAmespace project. License accessible as nucutils.license.
 # corresponding codons, and start codons.
 from fastac import translationtables
 import random
+import bisect
 
 def _chunks(l, n):
     "Yield successive n-sized chunks from l."
@@ -19,6 +20,12 @@ iupac_nucleotides = [ 'A', 'T', 'C', 'G', 'U',    # Canonical bases
                      'R', 'Y',               # "puRine" and "pYrimidine": AG vs CT
                      'N' ]         # Wildcards: any N.
 
+# Concrete bases matched by each IUPAC nucleotide code, in lowercase.
+iupac_expansions = {'A': 'a', 'C': 'c', 'G': 'g', 'T': 't', 'U': 't',
+                    'B': 'cgt', 'V': 'acg', 'D': 'agt', 'H': 'act',
+                    'S': 'cg', 'W': 'at', 'K': 'gt', 'M': 'ac',
+                    'R': 'ag', 'Y': 'ct', 'N': 'acgt'}
+
 aminoiupac = {'A': 'Alanine',              'B': 'Aspartic Acid or Asparagine',
               'C': 'Cysteine',             'D': 'Aspartic Acid',
               'E': 'Glutamic Acid',        'F': 'Phenylalanine',
@@ -138,3 +145,98 @@ def dumb_backtranslate(sequence, table):
         candidate_codons = translation_table['aminos'][amino]
         codons.append(random.choice(candidate_codons))
     return ''.join(codons)
+
+def parse_edit(string):
+    '''Parses an edit of the form "POS:REF>ALT" into a (position, ref, alt) tuple.
+    POS is 1-based; REF is the sequence replaced, or a number of bases to replace
+    without checking them; either REF or ALT may be empty, so "12:a>g" is a
+    substitution, "12:>ttt" inserts before base 12 and "12:3>" deletes 3 bases.'''
+    try:
+        position, change = string.split(":", 1)
+        ref, alt = change.split(">", 1)
+        position = int(position)
+    except ValueError:
+        raise ValueError("Edits must be of the form POS:REF>ALT, got: "+string)
+    if ref.isdigit(): ref = int(ref)
+    return position, ref, alt
+
+def read_edits(filename, chrom=None):
+    '''Reads edits from a tab/whitespace-separated file of "POS REF ALT" lines,
+    in which "-" or "." stand for an empty REF/ALT, or from a VCF file (lines
+    of 5 or more columns). Lines starting with "#" are skipped.
+    VCF rows with no ALT allele (".") are skipped, and symbolic, breakend and
+    "*" alleles are rejected. As edits apply to one sequence, a VCF file with
+    more than one CHROM is rejected unless chrom is given, in which case only
+    the rows for that CHROM are read.'''
+    edits, chroms = [], set()
+    with open(filename) as EditFile:
+        for line in EditFile:
+            fields = line.split()
+            if not fields or fields[0].startswith("#"): continue
+            if len(fields) >= 5:
+                if chrom is not None and fields[0] != chrom: continue
+                chroms.add(fields[0])
+                position, ref, alt = fields[1], fields[3], fields[4]
+                if alt == ".": continue
+                if alt == "*" or any(x in alt for x in "<>[]"):
+                    raise ValueError("Symbolic and breakend ALT alleles are not supported: "+line)
+            elif len(fields) == 3:
+                position, ref, alt = ['' if x in ("-", ".") else x for x in fields]
+            else:
+                raise ValueError("Could not read edit from line: "+line)
+            if "," in alt:
+                raise ValueError("Only one ALT allele may be given per edit: "+line)
+            edits.append((int(position), int(ref) if ref.isdigit() else ref, alt))
+    if len(chroms) > 1:
+        raise ValueError("Edits file {} covers several CHROMs ({}); choose one.".format(filename, ", ".join(sorted(chroms))))
+    return edits
+
+def check_edits(sequence, edits):
+    '''Validates (position, ref, alt) edits against sequence and returns them as
+    a sorted list of 0-based, half-open (start, end, alt) spans.
+    Raises ValueError if an edit is out of range, its REF does not match the
+    sequence, or it overlaps another edit (including two insertions at one spot).'''
+    spans = []
+    for position, ref, alt in edits:
+        start = position - 1
+        end = start + (ref if isinstance(ref, int) else len(ref))
+        if start < 0 or end > len(sequence):
+            raise ValueError("Edit at position {} is outside the sequence (length {}).".format(position, len(sequence)))
+        if not isinstance(ref, int) and sequence[start:end].lower() != ref.lower():
+            raise ValueError("Edit at position {} expected '{}' but found '{}'.".format(position, ref, sequence[start:end]))
+        spans.append((start, end, alt))
+    # Insertions sort before a substitution/deletion starting at the same base.
+    spans.sort(key=lambda span: (span[0], span[1]))
+    for prior, span in zip(spans, spans[1:]):
+        if span[0] < prior[1] or span[0] == span[1] == prior[0] == prior[1]:
+            raise ValueError("Edits at positions {} and {} overlap.".format(prior[0]+1, span[0]+1))
+    return spans
+
+def apply_edits(sequence, edits):
+    '''Applies a list of (position, ref, alt) edits to sequence in a single pass,
+    with all positions referring to the original sequence. See check_edits.'''
+    pieces, cursor = [], 0
+    for start, end, alt in check_edits(sequence, edits):
+        pieces.append(sequence[cursor:start])
+        pieces.append(alt)
+        cursor = end
+    pieces.append(sequence[cursor:])
+    return ''.join(pieces)
+
+def shift_comments(comments, spans):
+    '''Given a list of [start, end, comment] annotations (1-based, inclusive) and
+    the spans returned by check_edits, returns the annotations moved to match the
+    edited sequence. Positions inside a replaced span move to its replacement.'''
+    # Spans don't overlap, so their ends are sorted too.
+    ends = [end for start, end, alt in spans]
+    offsets = [0]
+    for start, end, alt in spans:
+        offsets.append(offsets[-1] + len(alt) - (end - start))
+    def shift(position, is_end):
+        index = position - 1
+        k = bisect.bisect_right(ends, index)
+        if k < len(spans) and spans[k][0] <= index:
+            start, end, alt = spans[k]
+            index = start + (max(len(alt) - 1, 0) if is_end else 0)
+        return index + offsets[k] + 1
+    return [[shift(c[0], False), max(shift(c[1], True), shift(c[0], False))] + list(c[2:]) for c in comments]
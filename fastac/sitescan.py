@@ -0,0 +1,123 @@
+'''Multi-pattern scanning of sequences for restriction sites and other motifs.
+Motifs may use IUPAC degenerate codes and are matched on both strands in a
+single pass per sequence, using an Aho-Corasick automaton.'''
+import itertools
+import collections
+import multiprocessing
+from fastac import sequtils
+
+def expand_motif(motif, limit=65536):
+    '''Returns every concrete lowercase DNA sequence matched by an IUPAC motif.
+    Raises ValueError for non-nucleotide codes or if there are more than limit.'''
+    try:
+        choices = [sequtils.iupac_expansions[base] for base in motif.upper()]
+    except KeyError as E:
+        raise ValueError("Motif '{}' contains non-IUPAC nucleotide code {}".format(motif, E))
+    count = 1
+    for bases in choices: count *= len(bases)
+    if count > limit:
+        raise ValueError("Motif '{}' expands to {} sequences, more than the limit of {}.".format(motif, count, limit))
+    return [''.join(x) for x in itertools.product(*choices)]
+
+def parse_motif(string):
+    'Parses a motif argument of form "NAME=MOTIF", or just "MOTIF", to (name, motif).'
+    if "=" in string:
+        name, motif = string.rsplit("=", 1)
+        return name, motif
+    return string, string
+
+class SiteScanner(object):
+    '''An Aho-Corasick automaton built from a list of (name, motif) pairs.
+    Each motif's reverse complement is also added, so one pass over a sequence
+    finds hits on both strands. The automaton is built as a full transition
+    table over "acgt", so scanning is one dict lookup per base; any other
+    character (such as N in the scanned sequence) matches nothing.'''
+    Alphabet = "acgt"
+
+    def __init__(self, motifs):
+        self.motifs = list(motifs)
+        # goto[state] maps a base to the next state, outputs[state] lists the
+        # (name, strand, length) of every pattern ending in that state.
+        self.goto = [{}]
+        self.outputs = [[]]
+        for name, motif in self.motifs:
+            forward = expand_motif(motif)
+            for pattern in forward:
+                self._add(pattern, (name, "+", len(pattern)))
+            reverse = set(expand_motif(sequtils.get_complement(motif)))
+            # Palindromic patterns are only reported once, on the + strand.
+            for pattern in reverse.difference(forward):
+                self._add(pattern, (name, "-", len(pattern)))
+        self._build()
+
+    def _add(self, pattern, output):
+        state = 0
+        for base in pattern:
+            if base not in self.goto[state]:
+                self.goto.append({})
+                self.outputs.append([])
+                self.goto[state][base] = len(self.goto) - 1
+            state = self.goto[state][base]
+        self.outputs[state].append(output)
+
+    def _build(self):
+        'Computes failure links breadth-first and folds them into goto.'
+        fail = [0] * len(self.goto)
+        queue = collections.deque()
+        for base in self.Alphabet:
+            if base in self.goto[0]: queue.append(self.goto[0][base])
+            else: self.goto[0][base] = 0
+        while queue:
+            state = queue.popleft()
+            self.outputs[state].extend(self.outputs[fail[state]])
+            for base in self.Alphabet:
+                if base in self.goto[state]:
+                    child = self.goto[state][base]
+                    fail[child] = self.goto[fail[state]][base]
+                    queue.append(child)
+                else:
+                    self.goto[state][base] = self.goto[fail[state]][base]
+
+    def scan(self, sequence):
+        '''Returns a list of (start, end, name, strand) hits in sequence, with
+        1-based inclusive positions, in order of their end position.'''
+        goto, outputs = self.goto, self.outputs
+        hits = []
+        state = 0
+        for i, base in enumerate(sequence.lower().replace("u", "t")):
+            state = goto[state].get(base, 0)
+            if outputs[state]:
+                for name, strand, length in outputs[state]:
+                    hits.append((i - length + 2, i + 1, name, strand))
+        return hits
+
+    @staticmethod
+    def describe(hits):
+        'Formats hits as a human-readable string.'
+        return ', '.join("{} ({}) at {}-{}".format(name, strand, start, end)
+                         for start, end, name, strand in hits)
+
+# Pool workers get the scanner once via the initializer, not with every block.
+_worker_scanner = None
+def _init_worker(scanner):
+    global _worker_scanner
+    _worker_scanner = scanner
+
+def _scan_worker(item):
+    title, sequence = item
+    return title, _worker_scanner.scan(sequence)
+
+def scan_namespace(compiler, scanner, processes=None):
+    '''Scans every block in a FastaCompiler's namespace, returning an OrderedDict
+    of title to hits. Blocks are scanned in parallel over a pool of processes
+    (default: one per CPU); processes=1 scans serially in this process.'''
+    items = [(title, compiler.namespace[title].sequence) for title in compiler.namespace]
+    if processes == 1 or len(items) < 2:
+        return collections.OrderedDict((title, scanner.scan(seq)) for title, seq in items)
+    pool = multiprocessing.Pool(processes, _init_worker, (scanner,))
+    try:
+        results = pool.map(_scan_worker, items)
+    finally:
+        pool.close()
+        pool.join()
+    return collections.OrderedDict(results)
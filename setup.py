@@ -24,6 +24,7 @@ setup(
     long_description=long_description,
     packages=packages,
     install_requires=[],
+    extras_require={"stats": ["numpy"]},
     scripts=["bin/fastac"],
     platforms="any",
     zip_safe=False,
@@ -0,0 +1,160 @@
+import os
+import gzip
+import json
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from fastac import CompileSession
+from fastac import bgzf
+
+class BgzfTestCase(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.random = random.Random(42)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def path(self, name):
+        return os.path.join(self.workdir, name)
+
+    def write_library(self):
+        'Writes lib.fasta, of 40 random parts and a block joining two, and lib.bgz.'
+        blocks = []
+        for i in range(40):
+            seq = ''.join(self.random.choice("acgt") for _ in range(3000))
+            blocks.append("> part{}\n; Part {}\n{}".format(i, i, seq))
+        blocks.append("> joined\n$include part3\n$include part27")
+        self.write("lib.fasta", "\n\n".join(blocks).encode())
+        bgzf.compress_file(self.path("lib.fasta"), self.path("lib.bgz"))
+
+    def write(self, name, data):
+        with open(self.path(name), "wb") as OutFile:
+            OutFile.write(data)
+        return self.path(name)
+
+class TestBgzfReader(BgzfTestCase):
+    def setUp(self):
+        BgzfTestCase.setUp(self)
+        # Three and a bit BGZF blocks of data.
+        self.data = ''.join(self.random.choice("acgt\n") for _ in range(3 * bgzf.MaxBlockData + 100)).encode()
+        self.write("plain", self.data)
+        bgzf.compress_file(self.path("plain"), self.path("plain.bgz"))
+
+    def test_detection(self):
+        self.assertTrue(bgzf.is_bgzf(self.path("plain.bgz")))
+        self.assertFalse(bgzf.is_bgzf(self.path("plain")))
+        with gzip.open(self.path("plain.gz"), "wb") as OutFile:
+            OutFile.write(self.data)
+        self.assertTrue(bgzf.is_gzip(self.path("plain.gz")))
+        self.assertFalse(bgzf.is_bgzf(self.path("plain.gz")))
+
+    def test_gzip_readable(self):
+        # BGZF is valid multi-member gzip, so streams through open_text too.
+        with bgzf.open_text(self.path("plain.bgz")) as InFile:
+            self.assertEqual(InFile.read().encode(), self.data)
+
+    def test_read_whole_file(self):
+        with bgzf.BgzfReader(self.path("plain.bgz")) as Reader:
+            self.assertEqual(Reader.read(len(self.data) + 10), self.data)
+            self.assertEqual(Reader.read(10), b"")
+
+    def test_seek_and_read_across_block_boundary(self):
+        with bgzf.BgzfReader(self.path("plain.bgz")) as Reader:
+            Reader.read(bgzf.MaxBlockData - 50)
+            offset = Reader.tell()
+            self.assertEqual(Reader.read(100), self.data[bgzf.MaxBlockData - 50:bgzf.MaxBlockData + 50])
+            # Now in the second block; seeking back reloads the first.
+            self.assertNotEqual(Reader.tell() >> 16, offset >> 16)
+            Reader.seek(offset)
+            self.assertEqual(Reader.read(100), self.data[bgzf.MaxBlockData - 50:bgzf.MaxBlockData + 50])
+
+    def test_readline_matches_plain(self):
+        with bgzf.BgzfReader(self.path("plain.bgz")) as Reader:
+            lines = []
+            while True:
+                line = Reader.readline()
+                if not line: break
+                lines.append(line)
+        self.assertEqual(lines, self.data.splitlines(True))
+
+    def test_corrupt_block_detected(self):
+        with open(self.path("plain.bgz"), "rb") as InFile:
+            data = bytearray(InFile.read())
+        # Flip a bit in the first block's stored CRC.
+        with bgzf.BgzfReader(self.path("plain.bgz")) as Reader:
+            crc_offset = Reader.next_block - 8
+        data[crc_offset] ^= 1
+        self.write("corrupt.bgz", bytes(data))
+        with self.assertRaises(ValueError):
+            bgzf.BgzfReader(self.path("corrupt.bgz"))
+
+class TestIndexedCompile(BgzfTestCase):
+    def setUp(self):
+        BgzfTestCase.setUp(self)
+        self.write_library()
+
+    def compile(self, name, targets=None):
+        Compiler = CompileSession().compiler()
+        Compiler.compile_file(self.path(name), targets)
+        return Compiler
+
+    def test_targets_match_plain_compile(self):
+        plain = self.compile("lib.fasta")
+        for targets in (["part0"], ["part17", "part39"], ["joined"]):
+            indexed = self.compile("lib.bgz", targets)
+            for title in indexed.namespace:
+                self.assertEqual(indexed.namespace[title].sequence, plain.namespace[title].sequence)
+                self.assertEqual(indexed.namespace[title].meta, plain.namespace[title].meta)
+        self.assertEqual(list(indexed.namespace), ["part3", "part27", "joined"])
+
+    def test_full_compile_matches_plain(self):
+        plain = self.compile("lib.fasta")
+        full = self.compile("lib.bgz")
+        self.assertEqual([b.as_metafasta() for b in full.namespace.values()],
+                         [b.as_metafasta() for b in plain.namespace.values()])
+
+    def test_index_cached_and_versioned(self):
+        self.compile("lib.bgz", ["part1"])
+        with open(self.path("lib.bgz" + bgzf.IndexSuffix)) as IndexFile:
+            saved = json.load(IndexFile)
+        self.assertEqual(saved['version'], bgzf.IndexVersion)
+        # An index from another version is ignored and rebuilt.
+        saved['version'] = bgzf.IndexVersion - 1
+        saved['blocks'] = []
+        with open(self.path("lib.bgz" + bgzf.IndexSuffix), "w") as IndexFile:
+            json.dump(saved, IndexFile)
+        index = bgzf.load_index(self.path("lib.bgz"), CompileSession().compiler().checked_scan)
+        self.assertEqual(len(index), 41)
+
+Package = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestCommandLine(BgzfTestCase):
+    def setUp(self):
+        BgzfTestCase.setUp(self)
+        self.write_library()
+
+    def fastac(self, name, *args):
+        env = dict(os.environ, PYTHONPATH=Package)
+        return subprocess.check_output([sys.executable, os.path.join(Package, "bin", "fastac"),
+                                        self.path(name)] + list(args), env=env).decode()
+
+    def test_compressed_main_file(self):
+        with open(self.path("lib.fasta"), "rb") as InputFile, gzip.open(self.path("lib.fasta.gz"), "wb") as OutFile:
+            OutFile.write(InputFile.read())
+        plain = self.fastac("lib.fasta")
+        self.assertEqual(self.fastac("lib.fasta.gz"), plain)
+        self.assertEqual(self.fastac("lib.bgz"), plain)
+
+    def test_bgzf_targets_use_index(self):
+        plain = self.fastac("lib.fasta", "--last")
+        self.assertTrue(plain.startswith("> joined"))
+        self.assertEqual(self.fastac("lib.bgz", "--last"), plain)
+        self.assertTrue(os.path.exists(self.path("lib.bgz" + bgzf.IndexSuffix)))
+        self.assertEqual(self.fastac("lib.bgz", "-t", "part5"), self.fastac("lib.fasta", "-t", "part5"))
+
+if __name__ == "__main__":
+    unittest.main()
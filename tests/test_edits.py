@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import unittest
+from fastac import CompileSession, FastaBlock
+from fastac import sequtils
+
+class TestCheckEdits(unittest.TestCase):
+    def test_two_insertions_at_one_position_rejected(self):
+        with self.assertRaisesRegex(ValueError, "overlap"):
+            sequtils.apply_edits("acgt", [(2, "", "g"), (2, "", "t")])
+
+    def test_overlapping_substitutions_rejected(self):
+        with self.assertRaisesRegex(ValueError, "overlap"):
+            sequtils.apply_edits("acgtacgt", [(2, "cgt", "aaa"), (4, "t", "g")])
+
+    def test_insertion_before_substitution_accepted(self):
+        # Insertions go before the base at their position.
+        self.assertEqual(sequtils.apply_edits("acgt", [(2, "c", "g"), (2, "", "tt")]), "attggt")
+
+    def test_insertion_after_substitution_accepted(self):
+        self.assertEqual(sequtils.apply_edits("acgt", [(2, "c", "g"), (3, "", "tt")]), "agttgt")
+
+    def test_ref_checked(self):
+        with self.assertRaisesRegex(ValueError, "expected"):
+            sequtils.apply_edits("acgt", [(2, "g", "a")])
+
+    def test_out_of_range(self):
+        with self.assertRaisesRegex(ValueError, "outside"):
+            sequtils.apply_edits("acgt", [(4, "tt", "")])
+        # Appending after the last base is allowed.
+        self.assertEqual(sequtils.apply_edits("acgt", [(5, "", "aa")]), "acgtaa")
+
+    def test_parse_edit(self):
+        self.assertEqual(sequtils.parse_edit("12:a>g"), (12, "a", "g"))
+        self.assertEqual(sequtils.parse_edit("12:>ttt"), (12, "", "ttt"))
+        self.assertEqual(sequtils.parse_edit("12:3>"), (12, 3, ""))
+
+class TestReadEdits(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def read(self, text):
+        filename = os.path.join(self.workdir, "edits")
+        with open(filename, "w") as EditFile:
+            EditFile.write(text)
+        return sequtils.read_edits(filename)
+
+    def test_tsv_dash_and_dot_are_empty(self):
+        edits = self.read("# pos ref alt\n3\tg\t-\n5\t.\tcc\n7\t2\t.\n")
+        self.assertEqual(edits, [(3, "g", ""), (5, "", "cc"), (7, 2, "")])
+
+    def test_vcf_columns(self):
+        # Indels keep their anchor base, and "." ALT rows carry no edit.
+        edits = self.read("##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\n"
+                          "x\t2\t.\tC\tT\nx\t5\tid1\tAG\tA\nx\t7\t.\tG\t.\nx\t8\t.\tG\tGTT\n")
+        self.assertEqual(edits, [(2, "C", "T"), (5, "AG", "A"), (8, "G", "GTT")])
+        self.assertEqual(sequtils.apply_edits("acgtaggg", edits), "aTgtAgGTT")
+
+    def test_vcf_symbolic_alleles_rejected(self):
+        for alt in ("<DEL>", "*", "G]x:5]"):
+            with self.assertRaisesRegex(ValueError, "Symbolic"):
+                self.read("x\t2\t.\tc\t{}\n".format(alt))
+
+    def test_vcf_chrom(self):
+        text = "x\t2\t.\tc\tg\ny\t3\t.\tg\tt\n"
+        with self.assertRaisesRegex(ValueError, "several CHROMs"):
+            self.read(text)
+        filename = os.path.join(self.workdir, "edits")
+        self.assertEqual(sequtils.read_edits(filename, "y"), [(3, "g", "t")])
+
+    def test_multiple_alt_alleles_rejected(self):
+        with self.assertRaises(ValueError):
+            self.read("x\t2\t.\ta\tc,g\n")
+
+class TestShiftComments(unittest.TestCase):
+    def edit(self, comments, edits, sequence="aaaaccccggggtttt"):
+        Block = FastaBlock("x", sequence, {"comments": comments})
+        Block.apply_edits(edits)
+        return Block.sequence, Block.meta['comments']
+
+    def test_deleted_span(self):
+        # Comment over the deleted cccc collapses onto the join.
+        seq, comments = self.edit([[5, 8, "cs"], [9, 12, "gs"]], [(5, "cccc", "")])
+        self.assertEqual(seq, "aaaaggggtttt")
+        self.assertEqual(comments, [[5, 5, "cs"], [5, 8, "gs"]])
+
+    def test_partly_deleted_span(self):
+        seq, comments = self.edit([[5, 8, "cs"]], [(6, 2, "")])
+        self.assertEqual(seq, "aaaaccggggtttt")
+        self.assertEqual(comments, [[5, 6, "cs"]])
+
+    def test_span_extended_by_insertion(self):
+        seq, comments = self.edit([[5, 8, "cs"], [13, 16, "ts"]], [(7, "", "aaa")])
+        self.assertEqual(seq, "aaaaccaaaccggggtttt")
+        self.assertEqual(comments, [[5, 11, "cs"], [16, 19, "ts"]])
+
+    def test_insertion_at_comment_start_shifts_it(self):
+        seq, comments = self.edit([[5, 8, "cs"]], [(5, "", "tt")])
+        self.assertEqual(comments, [[7, 10, "cs"]])
+
+class TestEditMacro(unittest.TestCase):
+    def compile(self, script):
+        Compiler = CompileSession().compiler()
+        Compiler.compile_multifasta(script)
+        return Compiler
+
+    def test_edit_block(self):
+        Compiler = self.compile("> base\naaaaccccggggtttt\n\n> edited\n$edit base 1:a>g 5:cc> 9:>TTT 16:t>acg")
+        self.assertEqual(Compiler.get_block_sequence("edited"), "gaaacctttggggtttacg")
+
+    def test_edit_here_shifts_comments(self):
+        Compiler = self.compile("> here\naaaaccccgg\n; mark\nggtttt\n; tail\n$edit --here 5:4> 11:g>c")
+        Block = Compiler.get_block("here")
+        self.assertEqual(Block.sequence, "aaaaggcgtttt")
+        self.assertEqual(Block.meta['comments'], [[7, 7, "mark"], [13, 13, "tail"]])
+
+if __name__ == "__main__":
+    unittest.main()
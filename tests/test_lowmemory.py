@@ -0,0 +1,41 @@
+import unittest
+from fastac import CompileSession
+
+Script = """> P1 {"private":true}
+aaaa
+
+> P2 {"private":true}
+cccc
+
+> X
+$include P1
+
+> Y
+$include X
+"""
+
+class TestLowMemory(unittest.TestCase):
+    def compiler(self):
+        return CompileSession().compiler(low_memory=True)
+
+    def test_private_blocks_released_after_last_use(self):
+        Compiler = self.compiler()
+        Compiler.compile_multifasta(Script)
+        self.assertEqual(list(Compiler.namespace), ["X", "Y"])
+        self.assertEqual(Compiler.released, set(["P1", "P2"]))
+        with self.assertRaisesRegex(ValueError, "released"):
+            Compiler.get_block("P1")
+
+    def test_private_targets_kept(self):
+        Compiler = self.compiler()
+        Compiler.compile_multifasta(Script, ["P2", "Y"])
+        self.assertEqual(list(Compiler.namespace), ["P2", "X", "Y"])
+        self.assertEqual(Compiler.released, set(["P1"]))
+
+    def test_redefined_private_block_kept(self):
+        Compiler = self.compiler()
+        Compiler.compile_multifasta('> P {"private":true}\naa\n\n> P {"private":true}\n$include P\ngg\n\n> Z\n$include P')
+        self.assertEqual(Compiler.get_block_sequence("Z"), "aagg")
+
+if __name__ == "__main__":
+    unittest.main()
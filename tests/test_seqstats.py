@@ -0,0 +1,102 @@
+import os
+import json
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from fastac import CompileSession
+from fastac import seqstats
+
+class TestWindows(unittest.TestCase):
+    def test_gc_windows(self):
+        self.assertEqual(list(seqstats.gc_windows("aagGcc", 2)), [0.0, 0.5, 1.0, 1.0, 1.0])
+        # Windows longer than the sequence shrink to fit it.
+        self.assertEqual(list(seqstats.gc_windows("atgc", 10)), [0.5])
+
+    def test_homopolymers(self):
+        starts, lengths = seqstats.homopolymers("aaacGg")
+        self.assertEqual(list(starts), [0, 3, 4])
+        self.assertEqual(list(lengths), [3, 1, 2])
+
+class TestRepeatedKmers(unittest.TestCase):
+    def test_repeats_marked(self):
+        # acgt occurs three times; k-mers spanning the n are ignored.
+        repeated = seqstats.repeated_kmers("acgtnacgtacgt", 4)
+        self.assertEqual([int(x) for x in repeated], [1, 0, 0, 0, 0, 1, 0, 0, 0, 1])
+
+    def test_masked_kmers_not_confused(self):
+        # n must not pack like any base, or "annn" would match "aaaa".
+        self.assertFalse(seqstats.repeated_kmers("aaaannnncccc", 4).any())
+        self.assertEqual(seqstats.repeated_kmers("uuuutttt", 4).sum(), 5)
+
+    def test_k_capped_at_32(self):
+        rng = random.Random(1)
+        copy = ''.join(rng.choice("acgt") for _ in range(40))
+        repeated = seqstats.repeated_kmers(copy + copy, 40)
+        self.assertEqual(len(repeated), 80 - 32 + 1)
+        self.assertEqual(list(repeated.nonzero()[0]), list(range(9)) + list(range(40, 49)))
+
+    def test_short_sequence(self):
+        self.assertEqual(len(seqstats.repeated_kmers("acgt", 16)), 0)
+
+class TestSequenceStats(unittest.TestCase):
+    def test_violation_coordinates(self):
+        stats = seqstats.sequence_stats("atatatatat" + "g" * 12 + "atatatatat", window=10)
+        self.assertEqual(stats['gc'], 0.375)
+        self.assertEqual(stats['longest_homopolymer'], [11, 22, "g"])
+        self.assertEqual([v[:2] for v in stats['violations']], [[1, 12], [9, 24], [21, 32], [11, 22]])
+        self.assertEqual((stats['gc_violations'], stats['homopolymer_violations'], stats['repeat_violations']), (3, 1, 0))
+        self.assertFalse(stats['truncated'])
+
+    def test_repeat_hotspots(self):
+        stats = seqstats.sequence_stats("acgtacgt" + "tttg" + "acgtacgt", window=20, repeat_length=8)
+        self.assertEqual(stats['repeat_hotspots'], [[1, 8], [13, 20]])
+        self.assertEqual(stats['repeat_violations'], 2)
+
+    def test_truncated(self):
+        stats = seqstats.sequence_stats(("a" * 10 + "c" * 10) * 13, window=20)
+        self.assertEqual(stats['homopolymer_violations'], 26)
+        self.assertEqual(len([v for v in stats['violations'] if v[2].startswith("Homopolymer")]), seqstats.MaxRegions)
+        self.assertTrue(stats['truncated'])
+
+    def test_empty(self):
+        self.assertEqual(seqstats.sequence_stats("")['violations'], [])
+
+class TestStatsMacro(unittest.TestCase):
+    def test_stats_macro(self):
+        Compiler = CompileSession().compiler()
+        Compiler.compile_multifasta("> x\naaaaaaaaaaaacg\n$stats --window 7 --max-homopolymer 10\ntttt")
+        stats = Compiler.get_block("x").meta['stats']
+        # Only the sequence before the macro line is checked.
+        self.assertEqual(stats['length'], 14)
+        self.assertEqual(stats['homopolymer_violations'], 1)
+        self.assertEqual(stats['violations'][-1][:2], [1, 12])
+
+    def test_add_stats_skips_aminos(self):
+        Compiler = CompileSession().compiler()
+        Compiler.compile_multifasta('> dna\nacgtacgt\n\n> pep {"type":"aminos"}\nMKLV')
+        self.assertEqual(list(Compiler.add_stats(window=4)), ["dna"])
+        self.assertNotIn("stats", Compiler.get_block("pep").meta)
+
+    def test_stats_report(self):
+        workdir = tempfile.mkdtemp()
+        try:
+            fastafile, report = os.path.join(workdir, "x.fasta"), os.path.join(workdir, "report.json")
+            with open(fastafile, "w") as OutFile:
+                OutFile.write("> x\nggggggggggcc\n\n> y\natat")
+            package = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            subprocess.check_output([sys.executable, os.path.join(package, "bin", "fastac"), fastafile,
+                                     "--stats-report", report, "--window", "4"],
+                                    env=dict(os.environ, PYTHONPATH=package))
+            with open(report) as ReportFile:
+                stats = json.load(ReportFile)
+            self.assertEqual(list(stats), ["x", "y"])
+            self.assertEqual(stats['x']['longest_homopolymer'], [1, 10, "g"])
+            self.assertEqual(stats['y']['gc_violations'], 1)
+        finally:
+            shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    unittest.main()
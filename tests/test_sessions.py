@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from fastac import CompileSession, SharedLibraryCache, FastaCompiler, Macros
+
+# Randomly back-translated, so two compiles of it almost never agree.
+Library = "> pep\nMKLVRAGSTWYHEQNDFPIC\n\n> rnd\n$dumb_backtranslate pep\n\n" + \
+          "\n\n".join("> part{0}\n$include rnd".format(i) for i in range(50))
+
+class CountingSession(CompileSession):
+    'Appends the name of every library it compiles to a (shared) list.'
+    def __init__(self, compiled, library_cache=None):
+        super(CountingSession, self).__init__(library_cache=library_cache)
+        self.compiled = compiled
+
+    def compile_library(self, libname, targets=None):
+        self.compiled.append(libname)
+        return super(CountingSession, self).compile_library(libname, targets)
+
+class TestSessions(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.libname = os.path.join(self.workdir, "lib.fasta")
+        with open(self.libname, "w") as LibFile:
+            LibFile.write(Library)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def design(self, i):
+        return "> design{0}\naaaa\n$include {1}.part{0}\n$include {1}.rnd".format(i % 50, self.libname)
+
+    def test_compilers_do_not_share_templates(self):
+        for First, Second in [(FastaCompiler(), FastaCompiler()),
+                              (CompileSession().compiler(), CompileSession().compiler())]:
+            First.compile_multifasta("aa{0}\n$def_template t")
+            self.assertIn("t", First.templates)
+            self.assertNotIn("t", Second.templates)
+
+    def test_sessions_have_own_macros(self):
+        First, Second = CompileSession(), CompileSession()
+        First.macros['shout'] = lambda args, env_dict: "a" * 4
+        First.compiler().compile_multifasta("> x\n$shout")
+        self.assertNotIn("shout", Second.macros)
+        self.assertNotIn("shout", Macros)
+
+    def test_sessions_have_own_libraries(self):
+        compiled = []
+        First, Second = CountingSession(compiled), CountingSession(compiled)
+        for Session in (First, Second, First):
+            Session.compiler().compile_multifasta(self.design(0))
+        self.assertEqual(compiled, [self.libname, self.libname])
+        self.assertIsNot(First.get_library(self.libname), Second.get_library(self.libname))
+
+    def test_threads_share_library_cache(self):
+        Cache, compiled = SharedLibraryCache(), []
+        def compile_design(i):
+            Compiler = CountingSession(compiled, Cache).compiler()
+            Compiler.compile_multifasta(self.design(i))
+            return Compiler.get_block_sequence("design{}".format(i % 50))
+        with ThreadPoolExecutor(max_workers=8) as Pool:
+            results = list(Pool.map(compile_design, range(200)))
+        self.assertEqual(len(compiled), 1)
+        # Every design used the same compile of the randomly back-translated block.
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(len(results[0]), 4 + 2 * 60)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from fastac import CompileSession, FastaCompileError
+from fastac import sitescan
+
+Root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Block A pulls a single motif out of the site library, so a targeted compile
+# has a pruned copy of it cached by the time block B asks for every site.
+SiteScript = """> A
+$include RestrictionSites.fasta.EcoRI
+
+> B
+aaaaGGTCTCaaaa
+$assert_no_sites --sites RestrictionSites.fasta
+"""
+
+class TestSiteScanner(unittest.TestCase):
+    def test_both_strands(self):
+        scanner = sitescan.SiteScanner([("BsaI", "GGTCTC")])
+        hits = scanner.scan("aaggtctcaagagaccaa")
+        self.assertEqual(hits, [(3, 8, "BsaI", "+"), (11, 16, "BsaI", "-")])
+
+    def test_palindrome_reported_once(self):
+        scanner = sitescan.SiteScanner([("EcoRI", "GAATTC")])
+        self.assertEqual(scanner.scan("ttgaattctt"), [(3, 8, "EcoRI", "+")])
+
+    def test_degenerate_motif(self):
+        scanner = sitescan.SiteScanner([("BglI", "GCCNNNNNGGC")])
+        self.assertEqual(len(scanner.scan("agccatgcaggca")), 1)
+        self.assertEqual(scanner.scan("agccatgcanggca"), [])
+
+class TestAnnotateSites(unittest.TestCase):
+    def test_comments_written(self):
+        Compiler = CompileSession().compiler()
+        Compiler.compile_multifasta("> x\n; start\naaGAATTCaagagacctt\n$annotate_sites EcoRI=GAATTC BsaI=GGTCTC\ngg")
+        self.assertEqual(Compiler.get_block("x").meta['comments'],
+                         [[1, 1, "start"], [3, 8, "EcoRI (+)"], [11, 16, "BsaI (-)"]])
+
+    def test_scan_namespace_matches_serial(self):
+        rng = random.Random(3)
+        Compiler = CompileSession().compiler()
+        Compiler.compile_multifasta("\n\n".join("> b{}\n{}".format(i, ''.join(rng.choice("acgt") for _ in range(2000)))
+                                                for i in range(6)))
+        scanner = sitescan.SiteScanner([("BsaI", "GGTCTC"), ("BglI", "GCCNNNNNGGC"), ("AluI", "AGCT")])
+        serial = sitescan.scan_namespace(Compiler, scanner, processes=1)
+        self.assertEqual(list(serial), ["b{}".format(i) for i in range(6)])
+        self.assertTrue(any(serial.values()))
+        self.assertEqual(sitescan.scan_namespace(Compiler, scanner, processes=2), serial)
+
+class TestAssertNoSites(unittest.TestCase):
+    def setUp(self):
+        self.olddir = os.getcwd()
+        self.workdir = tempfile.mkdtemp()
+        shutil.copy(os.path.join(Root, "libs", "RestrictionSites.fasta"), self.workdir)
+        os.chdir(self.workdir)
+        with open("sites.fasta", "w") as Script:
+            Script.write(SiteScript)
+
+    def tearDown(self):
+        os.chdir(self.olddir)
+        shutil.rmtree(self.workdir)
+
+    def test_full_compile_fails(self):
+        with self.assertRaisesRegex(FastaCompileError, "BsaI"):
+            CompileSession().compiler().compile_file("sites.fasta")
+
+    def test_targeted_compile_checks_every_site(self):
+        with self.assertRaisesRegex(FastaCompileError, "BsaI"):
+            CompileSession().compiler().compile_file("sites.fasta", ["A", "B"])
+
+if __name__ == "__main__":
+    unittest.main()
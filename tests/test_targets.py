@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+from fastac import CompileSession, FastaCompileError
+
+Script = """> A
+aaaa
+
+> B {"private":true}
+cccc
+
+> C
+$include A
+gggg
+
+# An anonymous block defining a template
+{B}{0}
+$def_template wrap
+
+> D
+$use_template wrap C
+
+> E
+tttt
+"""
+
+class TestTargets(unittest.TestCase):
+    def compile(self, script, targets):
+        Compiler = CompileSession().compiler()
+        Compiler.compile_multifasta(script, targets)
+        return Compiler
+
+    def test_only_needed_blocks_compiled(self):
+        Compiler = self.compile(Script, ["C"])
+        self.assertEqual(list(Compiler.namespace), ["A", "C"])
+
+    def test_template_and_its_fields_compiled(self):
+        Compiler = self.compile(Script, ["D"])
+        self.assertEqual(list(Compiler.namespace), ["A", "B", "C", "D"])
+        self.assertEqual(Compiler.get_block_sequence("D"), "ccccaaaagggg")
+
+    def test_bad_macro_line_names_block(self):
+        with self.assertRaisesRegex(FastaCompileError, "first line > B"):
+            self.compile('> A\naaaa\n\n> B\n$include "A', ["A"])
+
+Library = """> pep
+MKLVRAGSTW
+
+> rnd
+$dumb_backtranslate pep
+
+> other
+tttt
+"""
+
+class CountingSession(CompileSession):
+    'Records the targets of every library compile.'
+    def __init__(self):
+        super(CountingSession, self).__init__()
+        self.compiled = []
+
+    def compile_library(self, libname, targets=None):
+        self.compiled.append(None if targets is None else set(targets))
+        return super(CountingSession, self).compile_library(libname, targets)
+
+class TestLibraryTargets(unittest.TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.libname = os.path.join(self.workdir, "rl.fasta")
+        with open(self.libname, "w") as LibFile:
+            LibFile.write(Library)
+        self.script = "\n\n".join(["> first\n$include {0}.rnd",
+                                   "> second\n$include {0}.other",
+                                   "> third\n$include {0}.rnd"]).format(self.libname)
+
+    def tearDown(self):
+        shutil.rmtree(self.workdir)
+
+    def test_full_compile_compiles_library_once(self):
+        Session = CountingSession()
+        Compiler = Session.compiler()
+        Compiler.compile_multifasta(self.script)
+        self.assertEqual(Session.compiled, [None])
+        # The randomly back-translated block is the same each time it is included.
+        self.assertEqual(Compiler.get_block_sequence("first"), Compiler.get_block_sequence("third"))
+
+    def test_targeted_compile_prunes_library_once(self):
+        Session = CountingSession()
+        Compiler = Session.compiler()
+        Compiler.compile_multifasta(self.script, ["first", "third"])
+        self.assertEqual(list(Compiler.namespace), ["first", "third"])
+        self.assertEqual(Session.compiled, [set(["rnd"])])
+        self.assertEqual(Compiler.get_block_sequence("first"), Compiler.get_block_sequence("third"))
+        # A later full compile in the session doesn't reuse the pruned library.
+        Session.compiler().compile_multifasta(self.script)
+        self.assertEqual(Session.compiled, [set(["rnd"]), None])
+
+if __name__ == "__main__":
+    unittest.main()